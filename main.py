@@ -2,25 +2,86 @@
 # An AI-powered virtual interviewer that generates questions, analyzes voice/text answers, and gives instant feedback using Google Gemini, NLP, and WebRTC. Built with Python and Streamlit to automate interview practice and initial screening efficiently.
 import streamlit as st
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import speech_recognition as sr
-import tempfile
+import io
 import os
+import tempfile
 import json
+import asyncio
+import time
 import logging
+import contextlib
 import subprocess
+import threading
 from pathlib import Path
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from tenacity import (
+    retry, retry_if_exception_type, stop_after_attempt, stop_after_delay, wait_exponential_jitter
+)
+
+try:
+    # Optional: in-process audio decoding, avoids spawning ffmpeg per answer
+    import av
+    import numpy as np
+except ImportError:
+    av = None
+
+try:
+    # Optional: local int8 Whisper transcription, no network round-trip
+    from faster_whisper import WhisperModel
+    import numpy as np
+except ImportError:
+    WhisperModel = None
+
+try:
+    # Optional: faster JSON for Gemini responses and the questions cache
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj):
+        return json.dumps(obj).encode()
+
+try:
+    import fcntl  # Used to grow the ffmpeg pipe buffer on Linux
+except ImportError:
+    fcntl = None
 
 # Stage 2: Page Configuration
 logging.basicConfig(level=logging.INFO)
 st.set_page_config(page_title="AI Virtual Interviewer", page_icon="🎤", layout="wide")
 st.title("🤖 AI Virtual Interviewer")
 
+@contextlib.contextmanager
+def log_timing(label):
+    """Logs how long the wrapped block took, e.g. to compare cold vs cached setup."""
+    start = time.perf_counter()
+    yield
+    logging.info(f"{label} took {(time.perf_counter() - start) * 1000:.0f} ms")
+
 # Stage 3: Gemini API Setup
+MODEL_NAME = "gemini-2.5-flash"
+# Deadlines cover the whole generation, not just connecting
+QUESTION_TIMEOUT = 15  # seconds; one short question per request
+FEEDBACK_TIMEOUT = 120  # seconds; multi-section feedback, possibly with thinking
+FEEDBACK_TIMINGS = ["After each question", "At the end (faster)"]
+
+# Streamlit reruns the whole script on every interaction; configuring once
+# keeps the SDK's client (and its open connection) alive across reruns.
+@st.cache_resource(show_spinner=False)
+def configure_gemini(api_key):
+    with log_timing("Gemini setup"):
+        genai.configure(api_key=api_key)
+
 try:
     # Try to get key from secrets, otherwise handle gracefully
     if "GEMINI_API_KEY" in st.secrets:
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        configure_gemini(st.secrets["GEMINI_API_KEY"])
         GEMINI_READY = True
     else:
         st.error("GEMINI_API_KEY not found in secrets.")
@@ -30,128 +91,491 @@ except Exception as e:
     st.error(f"Gemini setup failed: {e}")
 
 # Stage 4: Session State Initialization
-if "questions" not in st.session_state:
-    st.session_state.questions = []
-if "current_q" not in st.session_state:
-    st.session_state.current_q = 0
-if "feedback" not in st.session_state:
-    st.session_state.feedback = None
-if "setup_done" not in st.session_state:
-    st.session_state.setup_done = False
-if "mode" not in st.session_state:
-    st.session_state.mode = "Text ✎"  # Default
-if "name" not in st.session_state:
-    st.session_state.name = ""
+@dataclass
+class InterviewState:
+    """Everything the interview keeps between reruns, stored under one session key."""
+    questions: list = field(default_factory=list)
+    current_q: int = 0
+    feedback: Optional[str] = None
+    setup_done: bool = False
+    mode: str = "Text ✎"  # Default
+    name: str = ""
+    feedback_timing: str = FEEDBACK_TIMINGS[0]
+    transcripts: list = field(default_factory=list)  # (question, answer) pairs awaiting batch feedback
+    final_feedback: Optional[list] = None
+    final_feedback_error: Optional[str] = None  # Set when the batch call failed; cleared to retry
+
+# One session_state lookup per rerun; plain attribute access after that
+iv = st.session_state.setdefault("iv", InterviewState())
 
 # Stage 5: Helper Functions
+# Fixed preambles, set once as each model's system instruction so prompts only carry the delta.
+# They are far below Gemini's ~1,024-token minimum for explicit context caching.
+# Stripped so no stray newlines/indentation are sent as input tokens.
+QUESTION_INSTRUCTION = """
+You write professional interview questions.
+Return output as a JSON object with a 'text' field.
+""".strip()
+FEEDBACK_INSTRUCTION = """
+You are an expert interview coach.
+You will be given an interview question and the candidate's answer.
+
+Provide feedback in Markdown:
+1. **Clarity & Confidence**
+2. **Content Quality**
+3. **Improvement Tips**
+4. **Answer I want from candidate**
+""".strip()
+BATCH_FEEDBACK_INSTRUCTION = """
+You are an expert interview coach.
+You will be given a numbered list of interview questions and the candidate's answers.
+
+Return a JSON array with one object per question/answer pair, in the same order,
+with 'clarity', 'content', 'tips' and 'ideal_answer' fields written in Markdown.
+""".strip()
+# Per-request deltas, filled in with the dynamic fields only
+QUESTION_PROMPT = (
+    "Generate 1 interview question about {focus} for a candidate applying"
+    " for a '{role}' role at '{difficulty}' difficulty."
+)
+ANSWER_PROMPT = '**Question:** "{question}"\n**Candidate Answer:** "{answer}"'
+
+# JSON mode: Gemini returns bare JSON matching these schemas, no code fences
+QUESTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"text": {"type": "STRING"}},
+    "required": ["text"],
+}
+BATCH_FEEDBACK_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "clarity": {"type": "STRING"},
+            "content": {"type": "STRING"},
+            "tips": {"type": "STRING"},
+            "ideal_answer": {"type": "STRING"},
+        },
+        "required": ["clarity", "content", "tips", "ideal_answer"],
+    },
+}
+
+def _json_config(schema):
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+@st.cache_resource(show_spinner=False)
+def _model(system_instruction, generation_config=None):
+    return genai.GenerativeModel(
+        MODEL_NAME, system_instruction=system_instruction, generation_config=generation_config
+    )
+
+def get_question_model():
+    return _model(QUESTION_INSTRUCTION, _json_config(QUESTION_SCHEMA))
+
+def get_feedback_model():
+    return _model(FEEDBACK_INSTRUCTION)
+
+def get_batch_feedback_model():
+    return _model(BATCH_FEEDBACK_INSTRUCTION, _json_config(BATCH_FEEDBACK_SCHEMA))
+
+DEFAULT_QUESTIONS = [{"id": "q1", "text": "Tell me about yourself."}]
+SAMPLE_RATE = 16000  # 16k mono is what the recognizer works best with
+PIPE_BUFFER_SIZE = 1 << 20
+WHISPER_MODEL_NAME = "base.en"
+WARM_UP_TIMEOUT = 3  # seconds
+QUESTIONS_CACHE_FILE = Path.home() / ".cache" / "ai_interviewer" / "questions.json"
+FEEDBACK_CACHE_SIZE = 256
+# One Gemini call per question, each with its own focus so the set stays varied
+QUESTION_FOCUSES = [
+    "background and motivation",
+    "core technical skills",
+    "a problem-solving scenario",
+    "teamwork and communication",
+]
+
+@st.cache_resource(show_spinner=False)
+def get_event_loop():
+    """One long-lived event loop, so the async Gemini client keeps its connection open."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="gemini-loop", daemon=True).start()
+    return loop
+
+def run_async(coro):
+    """Runs a coroutine on the shared event loop and waits for the result."""
+    # asyncio.run would create (and close) a new loop per call, but the SDK's
+    # async client stays bound to the loop it was first used on.
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+# Rate limits and 5xx are common on the free tier; retry those briefly before giving up
+SERVER_GEMINI_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+)
+TIMEOUT_GEMINI_ERRORS = (google_exceptions.DeadlineExceeded, asyncio.TimeoutError)
+RETRY_BUDGET = 30  # seconds; no new attempt starts after this, so the UI can't hang
+
+def _gemini_retry(errors):
+    return retry(
+        retry=retry_if_exception_type(errors),
+        stop=stop_after_attempt(3) | stop_after_delay(RETRY_BUDGET),
+        wait=wait_exponential_jitter(initial=0.3, max=4),
+        reraise=True,
+    )
+
+# Short question calls can afford another try after a timeout; a feedback call
+# that already ran into its long deadline is not worth repeating.
+question_retry = _gemini_retry(SERVER_GEMINI_ERRORS + TIMEOUT_GEMINI_ERRORS)
+feedback_retry = _gemini_retry(SERVER_GEMINI_ERRORS)
+
+def _parse_question(raw_text):
+    return json_loads(raw_text)["text"]
+
+@question_retry
+async def _generate_question_async(question_model, prompt):
+    """Streams one question into a buffer, retrying without streaming if the JSON is bad."""
+    response = await question_model.generate_content_async(
+        prompt, stream=True, request_options={"timeout": QUESTION_TIMEOUT}
+    )
+    buffer = "".join([chunk.text async for chunk in response])
+    try:
+        return _parse_question(buffer)
+    except (ValueError, KeyError) as e:
+        logging.warning(f"Streamed question was not valid JSON, retrying: {e}")
+        response = await question_model.generate_content_async(
+            prompt, request_options={"timeout": QUESTION_TIMEOUT}
+        )
+        return _parse_question(response.text)
+
+async def generate_questions_async(question_model, role, difficulty):
+    """Generates interview questions concurrently, one Gemini call per question."""
+    prompts = [
+        QUESTION_PROMPT.format(focus=focus, role=role, difficulty=difficulty)
+        for focus in QUESTION_FOCUSES
+    ]
+    # return_exceptions keeps the questions that did succeed if one call fails
+    results = await asyncio.gather(
+        *[_generate_question_async(question_model, p) for p in prompts], return_exceptions=True
+    )
+    questions = []
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Question generation call failed: {result}")
+            continue
+        questions.append({"id": f"q{len(questions) + 1}", "text": result})
+    return questions
+
+def _load_questions_cache():
+    try:
+        return json_loads(QUESTIONS_CACHE_FILE.read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+@st.cache_resource(show_spinner=False)
+def _questions_cache_lock():
+    """Serializes read-modify-write of the cache file across sessions."""
+    return threading.Lock()
+
+def _save_questions_cache(cache):
+    # Write to a temp file and swap it in, so readers never see a half-written file
+    try:
+        QUESTIONS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=QUESTIONS_CACHE_FILE.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(json_dumps(cache))
+            os.replace(tmp_path, QUESTIONS_CACHE_FILE)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError as e:
+        logging.warning(f"Could not write questions cache: {e}")
+
+def _add_to_questions_cache(key, questions, salt):
+    with _questions_cache_lock():
+        # Re-read under the lock so entries other sessions just wrote are kept
+        cache = _load_questions_cache()
+        # Only keep today's entries so the file doesn't grow forever
+        cache = {k: v for k, v in cache.items() if k.endswith(f"|{salt}")}
+        cache[key] = questions
+        _save_questions_cache(cache)
+
+class IncompleteQuestionsError(Exception):
+    """Some question calls failed; carries the questions that did succeed."""
+    def __init__(self, questions):
+        super().__init__(f"Only {len(questions)} of {len(QUESTION_FOCUSES)} questions were generated.")
+        self.questions = questions
+
+# st.cache_data rather than functools.lru_cache: Streamlit re-executes this
+# script on every rerun, which would throw away a plain lru_cache each time.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _generate_questions_cached(role, difficulty, salt):
+    """Returns questions for (role, difficulty), checking the disk cache before Gemini."""
+    key = f"{role}|{difficulty}|{salt}"
+    cached = _load_questions_cache().get(key)
+    if cached is not None:
+        return cached
+
+    questions = run_async(generate_questions_async(get_question_model(), role, difficulty))
+    if len(questions) < len(QUESTION_FOCUSES):
+        # Raise so that a partial set (e.g. some calls were rate limited) is never
+        # memoized or written to disk; generate_questions still uses what we got.
+        raise IncompleteQuestionsError(questions)
+
+    _add_to_questions_cache(key, questions, salt)
+    return questions
+
 def generate_questions(role, difficulty):
     """Generates interview questions using Gemini."""
-    prompt = f"""
-    Generate 4 professional interview questions for a candidate applying for a '{role}' role at '{difficulty}' difficulty.
-    Return output as a JSON array with 'id' and 'text' fields.
-    """
     if not GEMINI_READY:
-        return [{"id": "q1", "text": "Tell me about yourself."}]
+        return DEFAULT_QUESTIONS
     try:
-        response = model.generate_content(prompt)
-        clean_json = response.text.strip().lstrip("```json").rstrip("```")
-        return json.loads(clean_json)
+        # Day bucket as salt so cached questions refresh daily
+        questions = _generate_questions_cached(role, difficulty, time.strftime("%Y-%m-%d"))
+    except IncompleteQuestionsError as e:
+        logging.warning(str(e))
+        questions = e.questions
     except Exception as e:
         st.error(f"Error generating questions: {e}")
-        return [{"id": "q1", "text": "Tell me about yourself."}]
+        return DEFAULT_QUESTIONS
+    return questions or DEFAULT_QUESTIONS
+
+def _decode_with_av(audio_bytes):
+    """Decodes a recording in-process to 16k mono 16-bit PCM bytes."""
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    chunks = []
+    with av.open(io.BytesIO(audio_bytes)) as container:
+        for frame in container.decode(audio=0):
+            chunks.extend(f.to_ndarray() for f in resampler.resample(frame))
+        # Flush whatever the resampler is still buffering
+        chunks.extend(f.to_ndarray() for f in resampler.resample(None))
+    if not chunks:
+        return b""
+    return np.concatenate(chunks, axis=1).astype(np.int16).tobytes()
+
+def _grow_pipe(pipe):
+    """Raises a pipe's kernel buffer above the small default (Linux only)."""
+    if fcntl is None or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(pipe.fileno(), fcntl.F_SETPIPE_SZ, PIPE_BUFFER_SIZE)
+    except OSError as e:
+        logging.debug(f"Could not resize pipe: {e}")
+
+def _decode_with_ffmpeg(audio_bytes):
+    """Converts to 16k mono 16-bit PCM with ffmpeg, piping through stdin/stdout."""
+    # ffmpeg is told to print nothing, so stderr is inherited rather than piped to DEVNULL.
+    # A single thread is plenty for a short answer clip; -threads is per stream,
+    # so it's given before -i for the decoder and again for the encoder.
+    proc = subprocess.Popen([
+        "ffmpeg", "-nostdin", "-loglevel", "quiet", "-nostats",
+        "-threads", "1",
+        "-i", "pipe:0",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-threads", "1",
+        "-f", "s16le", "pipe:1"
+    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=PIPE_BUFFER_SIZE)
+    _grow_pipe(proc.stdin)
+    _grow_pipe(proc.stdout)
+    pcm, _ = proc.communicate(audio_bytes)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+    return pcm
+
+def _load_audio(audio_bytes, recognizer):
+    """Returns the recording as 16k mono AudioData, trying the cheapest decoder first."""
+    decoders = [_decode_with_ffmpeg] if av is None else [_decode_with_av, _decode_with_ffmpeg]
+    for decode in decoders:
+        try:
+            return sr.AudioData(decode(audio_bytes), SAMPLE_RATE, 2)
+        except Exception as e:
+            logging.warning(f"{decode.__name__} failed: {e}")
+
+    # Last resort: let SpeechRecognition read the original recording
+    with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+        return recognizer.record(source)
 
-def transcribe_audio(audio_file_path):
+@st.cache_resource(show_spinner=False)
+def get_recognizer():
+    """Shared recognizer, reused instead of building one per answer."""
+    return sr.Recognizer()
+
+@st.cache_resource(show_spinner=False)
+def warm_up_google_recognizer():
     """
-    Transcribes audio using Google Speech Recognition.
-    Converts to compatible WAV format first using ffmpeg.
+    Sends 0.1s of silence to Google once per process. recognize_google opens a
+    fresh urllib connection per call, so this only primes DNS and the TLS session
+    cache; it doesn't keep a connection open.
     """
     recognizer = sr.Recognizer()
-    
-    # Define a temp path for the converted file
-    tmp_wav = f"{audio_file_path}_converted.wav"
-    
+    # Short timeout so a slow network can't hold up the page (default is none)
+    recognizer.operation_timeout = WARM_UP_TIMEOUT
     try:
-        # Use ffmpeg to convert input to 16k mono wav (best for recognition)
-        subprocess.run([
-            "ffmpeg", "-y", 
-            "-i", audio_file_path, 
-            "-ac", "1", 
-            "-ar", "16000", 
-            tmp_wav
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Use the converted file
-        process_path = tmp_wav
+        with log_timing("Recognizer warm-up"):
+            recognizer.recognize_google(sr.AudioData(b"\x00" * 3200, SAMPLE_RATE, 2))
     except Exception as e:
-        logging.warning(f"FFmpeg conversion failed: {e}. Trying original file.")
-        process_path = audio_file_path
+        logging.debug(f"Recognizer warm-up: {e!r}")
+
+@st.cache_resource(show_spinner="Loading speech model...")
+def get_whisper_model():
+    with log_timing("Whisper model load"):
+        return WhisperModel(WHISPER_MODEL_NAME, device="cpu", compute_type="int8")
+
+def _transcribe_with_whisper(audio_data):
+    """Transcribes locally with faster-whisper, returns None if nothing was said."""
+    raw = audio_data.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+    pcm = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+    segments, _ = get_whisper_model().transcribe(pcm, language="en", beam_size=1, vad_filter=True)
+    text = " ".join(seg.text.strip() for seg in segments)
+    return text or None
+
+def transcribe_audio(audio_bytes):
+    """
+    Transcribes audio locally with faster-whisper when installed,
+    otherwise with Google Speech Recognition.
+    Resamples to 16k mono in-process with PyAV, falling back to ffmpeg.
+    """
+    recognizer = get_recognizer()
 
     try:
-        with sr.AudioFile(process_path) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-            
-        # Cleanup converted file
-        if os.path.exists(tmp_wav) and tmp_wav != audio_file_path:
-            os.remove(tmp_wav)
-            
-        return text
+        audio_data = _load_audio(audio_bytes, recognizer)
+        if WhisperModel is not None:
+            return _transcribe_with_whisper(audio_data)
+        return recognizer.recognize_google(audio_data)
     except sr.UnknownValueError:
         return None # Signal that audio wasn't understood
     except Exception as e:
         return f"Error: {str(e)}"
 
+@st.cache_resource(show_spinner=False)
+def _feedback_cache():
+    """Process-wide LRU of feedback, keyed by the (question_text, answer_text) pair."""
+    return OrderedDict(), threading.Lock()
+
+def _get_cached_feedback(key):
+    cache, lock = _feedback_cache()
+    with lock:
+        if key not in cache:
+            return None
+        cache.move_to_end(key)
+        return cache[key]
+
+def _store_feedback(key, feedback):
+    cache, lock = _feedback_cache()
+    with lock:
+        cache[key] = feedback
+        cache.move_to_end(key)
+        while len(cache) > FEEDBACK_CACHE_SIZE:
+            cache.popitem(last=False)
+
 def analyze_with_gemini(answer_text, question_text):
     """Sends transcript to Gemini for feedback."""
     st.info("Analyzing your response...")
-    prompt = f"""
-    You are an expert interview coach.
-    **Question:** "{question_text}"
-    **Candidate Answer:** "{answer_text}"
-
-    Provide feedback in Markdown:
-    1. **Clarity & Confidence**
-    2. **Content Quality**
-    3. **Improvement Tips**
-    4. ** Answer I want from candiadate **
-    """
+    key = (question_text, answer_text)
+    cached = _get_cached_feedback(key)
+    if cached is not None:
+        return cached
+    # The prompt is just the question/answer; the coaching preamble is the system instruction
+    prompt = ANSWER_PROMPT.format(question=question_text, answer=answer_text)
+    placeholder = st.empty()
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        # Render tokens as they arrive instead of waiting for the full response
+        stream = get_feedback_model().generate_content(
+            prompt, stream=True, request_options={"timeout": FEEDBACK_TIMEOUT}
+        )
+        feedback = ""
+        for chunk in stream:
+            feedback += chunk.text
+            placeholder.markdown(feedback)
+        _store_feedback(key, feedback)
+        return feedback
     except Exception as e:
         return f"Error getting feedback: {e}"
 
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    """Background workers for overlapping network calls with transcription."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="interviewer")
+
+def _warm_gemini():
+    try:
+        # Resolved here, on the worker, so any model setup overlaps transcription too.
+        # count_tokens is the cheapest round-trip that sets up the channel.
+        get_feedback_model().count_tokens("warm-up")
+    except Exception as e:
+        logging.debug(f"Gemini warm-up: {e!r}")
+
+def prewarm_gemini():
+    """Opens the Gemini connection in the background while the answer is being transcribed."""
+    if GEMINI_READY and iv.feedback_timing == FEEDBACK_TIMINGS[0]:
+        get_executor().submit(_warm_gemini)
+
+def _format_feedback(item):
+    return (
+        f"**Clarity & Confidence**\n\n{item['clarity']}\n\n"
+        f"**Content Quality**\n\n{item['content']}\n\n"
+        f"**Improvement Tips**\n\n{item['tips']}\n\n"
+        f"**Answer I want from candidate**\n\n{item['ideal_answer']}"
+    )
+
+@feedback_retry
+def analyze_all_with_gemini(pairs):
+    """Gets feedback for every (question, answer) pair in a single Gemini call."""
+    prompt = "\n\n".join(
+        f"{i}. " + ANSWER_PROMPT.format(question=question, answer=answer)
+        for i, (question, answer) in enumerate(pairs, 1)
+    )
+    response = get_batch_feedback_model().generate_content(
+        prompt, request_options={"timeout": FEEDBACK_TIMEOUT}
+    )
+    items = json_loads(response.text)
+    if len(items) != len(pairs):
+        raise ValueError(f"Expected feedback for {len(pairs)} answers, got {len(items)}.")
+    return [_format_feedback(item) for item in items]
+
+def submit_answer(answer_text, question_text):
+    """Analyzes the answer now, or queues it for the end-of-interview batch."""
+    if iv.feedback_timing == FEEDBACK_TIMINGS[1]:
+        iv.transcripts.append((question_text, answer_text))
+        iv.current_q += 1
+    else:
+        iv.feedback = analyze_with_gemini(answer_text, question_text)
+    st.rerun()
+
 # Stage 6: Main UI Logic
-if not st.session_state.setup_done:
+if not iv.setup_done:
     st.subheader("Interview Setup")
     
     col1, col2 = st.columns(2)
     with col1:
-        st.session_state.name = st.text_input("Full Name")
-        field = st.selectbox("Field", ["Student", "Professional"])
+        iv.name = st.text_input("Full Name")
+        career_field = st.selectbox("Field", ["Student", "Professional"])
     with col2:
         role = st.selectbox("Role", ["Software Engineer", "Data Analyst", "Product Manager"])
         difficulty = st.selectbox("Difficulty", ["Beginner", "Intermediate", "Advanced"])
 
     # Mode Selection
     mode = st.radio("Response Mode", ["Text ✎", "Voice 🎙️ (Real-time)"], index=1)
+    feedback_timing = st.radio("Feedback", FEEDBACK_TIMINGS)
 
     if st.button("🚀 Start Interview"):
-        if not st.session_state.name:
+        if not iv.name:
             st.error("Please enter your name.")
         elif not GEMINI_READY:
             st.error("Gemini API key missing.")
         else:
             with st.spinner("Generating questions..."):
-                st.session_state.questions = generate_questions(role, difficulty)
-            st.session_state.mode = mode
-            st.session_state.setup_done = True
+                iv.questions = generate_questions(role, difficulty)
+            iv.mode = mode
+            iv.feedback_timing = feedback_timing
+            iv.setup_done = True
             st.rerun()
 
 else:
     # Stage 7: Question & Answer Loop
-    q_idx = st.session_state.current_q
-    questions = st.session_state.questions
+    q_idx = iv.current_q
+    questions = iv.questions
     
     if q_idx < len(questions):
         q_data = questions[q_idx]
@@ -159,20 +583,23 @@ else:
         st.info(f"**{q_data['text']}**")
         
         # Check if we already have feedback for this question
-        if st.session_state.feedback:
+        if iv.feedback:
             st.success("Analysis Complete!")
             st.markdown("### 🤖 Gemini Feedback")
-            st.markdown(st.session_state.feedback)
+            st.markdown(iv.feedback)
             
             if st.button("Next Question ➡️"):
-                st.session_state.feedback = None
-                st.session_state.current_q += 1
+                iv.feedback = None
+                iv.current_q += 1
                 st.rerun()
         else:
             # Input Area based on Mode
-            if "Voice" in st.session_state.mode:
+            if "Voice" in iv.mode:
                 st.write("🎙️ **Record your answer below:**")
-                st.caption("Click the mic to start. Click again to stop. Feedback generates automatically.")
+                if iv.feedback_timing == FEEDBACK_TIMINGS[0]:
+                    st.caption("Click the mic to start. Click again to stop. Feedback generates automatically.")
+                else:
+                    st.caption("Click the mic to start. Click again to stop. Feedback comes at the end of the interview.")
                 
                 # THE NEW NATIVE WIDGET - No WebRTC complexity needed
                 audio_value = st.audio_input("Record Answer", key=f"audio_{q_idx}")
@@ -180,47 +607,64 @@ else:
                 if audio_value:
                     # Logic: Audio exists = User finished recording
                     with st.spinner("Transcribing audio..."):
-                        # Save to temp file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                            tmp_file.write(audio_value.read())
-                            tmp_path = tmp_file.name
-
-                        # Transcribe
-                        transcript = transcribe_audio(tmp_path)
-                        
-                        # Clean up temp file
-                        os.remove(tmp_path)
+                        # Transcribe straight from memory, with the Gemini connection warming up alongside
+                        prewarm_gemini()
+                        transcript = transcribe_audio(audio_value.getvalue())
 
                         if transcript:
                             st.write("🗣️ **You said:**")
                             st.info(f'"{transcript}"')
                             
                             # Generate Feedback
-                            feedback = analyze_with_gemini(transcript, q_data['text'])
-                            st.session_state.feedback = feedback
-                            st.rerun()
+                            submit_answer(transcript, q_data['text'])
                         else:
                             st.warning("Could not understand audio. Please try again.")
             
             else:
                 # Text Mode
-                answer = st.text_area("Type your answer here...")
+                # Keyed per question so the previous answer doesn't carry over
+                answer = st.text_area("Type your answer here...", key=f"answer_{q_idx}")
                 if st.button("Submit"):
                     if answer.strip():
-                        feedback = analyze_with_gemini(answer, q_data['text'])
-                        st.session_state.feedback = feedback
-                        st.rerun()
+                        submit_answer(answer, q_data['text'])
                     else:
                         st.warning("Please write an answer first.")
 
     else:
+        transcripts = iv.transcripts
+        if transcripts and iv.final_feedback is None and iv.final_feedback_error is None:
+            with st.spinner("Analyzing your answers..."):
+                try:
+                    iv.final_feedback = analyze_all_with_gemini(transcripts)
+                except Exception as e:
+                    # Keep the answers and let the user retry, rather than calling again on every rerun
+                    iv.final_feedback_error = str(e)
+
         st.balloons()
-        st.success(f"Interview Complete! Great job, {st.session_state.name}.")
+        st.success(f"Interview Complete! Great job, {iv.name}.")
+        if transcripts and iv.final_feedback:
+            st.markdown("### 🤖 Gemini Feedback")
+            for i, ((question, answer), feedback) in enumerate(zip(transcripts, iv.final_feedback), 1):
+                with st.expander(f"Question {i}: {question}", expanded=True):
+                    st.caption(f'You said: "{answer}"')
+                    st.markdown(feedback)
+        if iv.final_feedback_error:
+            st.error(f"Error getting feedback: {iv.final_feedback_error}")
+            if st.button("Retry feedback"):
+                iv.final_feedback_error = None
+                st.rerun()
         if st.button("Start Over"):
-            st.session_state.clear()
+            st.session_state.clear()  # Drops iv too; it's recreated on rerun
             st.rerun()
 
 # Sidebar Info
 st.sidebar.markdown("### Debug Info")
-st.sidebar.text(f"Mode: {st.session_state.get('mode', 'Not set')}")
+st.sidebar.text(f"Mode: {iv.mode if iv.setup_done else 'Not set'}")
 st.sidebar.text(f"Gemini: {'Active' if GEMINI_READY else 'Inactive'}")
+
+# Warm up transcription once the page has rendered, only when answers are spoken
+if iv.setup_done and "Voice" in iv.mode:
+    if WhisperModel is not None:
+        get_whisper_model()
+    else:
+        warm_up_google_recognizer()